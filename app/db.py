@@ -0,0 +1,40 @@
+# Copyright (c) 2024  Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import functools
+import os
+from pymongo import MongoClient
+
+
+# Shared MongoDB connection for the scripts, created on first use
+@functools.lru_cache(maxsize=None)
+def get_client():
+    mongodb_host = os.getenv('MONGODB_HOST', 'mongodb://mongo:27017/')
+    # e.g. MONGODB_COMPRESSORS=zstd,snappy,zlib for a remote server; zstd and snappy need their python packages
+    compressors = os.getenv('MONGODB_COMPRESSORS')
+    if compressors:
+        return MongoClient(mongodb_host, maxPoolSize=32, compressors=compressors)
+    return MongoClient(mongodb_host, maxPoolSize=32)
+
+
+@functools.lru_cache(maxsize=None)
+def get_collection():
+    mongodb_name = os.getenv('MONGODB_NAME', 'geo_image_db')
+    return get_client()[mongodb_name]['images']
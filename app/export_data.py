@@ -20,22 +20,20 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import os
 import sys
-import json
-from pymongo import MongoClient
-
-mongodb_host = os.getenv('MONGODB_HOST', 'mongodb://mongo:27017/')
-mongodb_name = os.getenv('MONGODB_NAME', 'geo_image_db')
-client = MongoClient(mongodb_host)
-db = client[mongodb_name]
-collection = db['images']
+import orjson
+from db import get_collection
 
 
 def export_data(filepath):
-    entries = list(collection.find({}))
-    with open(filepath, "w") as output_stream:
-        output_stream.write(json.dumps(entries, default=str))
+    # write entries one by one so that the whole collection is never held in memory
+    with open(filepath, "wb") as output_stream, get_collection().find({}, no_cursor_timeout=True).batch_size(200) as cursor:
+        output_stream.write(b"[")
+        for i, entry in enumerate(cursor):
+            if i > 0:
+                output_stream.write(b", ")
+            output_stream.write(orjson.dumps(entry, default=str))
+        output_stream.write(b"]")
 
 
 if __name__ == '__main__':
@@ -20,21 +20,27 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
 import base64
 import os
 import argparse
 import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
-from openai import OpenAI
-from pymongo import MongoClient
+from openai import AsyncOpenAI
+from pymongo import UpdateOne
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 from PIL.TiffImagePlugin import IFDRational
 import hashlib
 import sys
 import json
+import tempfile
+import time
 from bson import ObjectId
+from db import get_collection
 
 IMAGE_DESCRIPTION_PROMPT = """
 # 概要
@@ -51,21 +57,96 @@ IMAGE_DESCRIPTION_PROMPT = """
 - 人
 - 乗り物
 """
-if os.getenv('OPENAI_API_KEY'):
-    openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
+EXIF_DATETIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+# keys which are not compared when updating an existing entry
+SKIP_DIFF_KEYS = {'image', 'exif'}
+_MISSING = object()
+OPENAI_MAX_RETRIES = 5
+
+# default to the tier-1 limits of gpt-4o
+DEFAULT_MAX_REQUESTS_PER_MINUTE = 500
+DEFAULT_MAX_TOKENS_PER_MINUTE = 30000
+# a 512px image fits in a single tile (85 base + 170 per tile)
+IMAGE_TOKENS = 255
+EXPECTED_COMPLETION_TOKENS = 500
+# seconds between status checks of a submitted batch
+BATCH_POLL_INTERVAL = 60
+# Batch API limits for one input file are 50,000 requests and 200 MB
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+
+
+class RateLimiter:
+    """Token bucket which sleeps before a request would exceed the requests/tokens per minute limits."""
+
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = max_requests_per_minute
+        self.available_token_capacity = max_tokens_per_minute
+        self.last_update_time = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.available_request_capacity = min(
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60.0,
+            self.max_requests_per_minute)
+        self.available_token_capacity = min(
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60.0,
+            self.max_tokens_per_minute)
+        self.last_update_time = now
+
+    async def acquire(self, estimated_tokens):
+        estimated_tokens = min(estimated_tokens, self.max_tokens_per_minute)
+        async with self.lock:
+            while True:
+                self.refill()
+                if self.available_request_capacity >= 1 and self.available_token_capacity >= estimated_tokens:
+                    self.available_request_capacity -= 1
+                    self.available_token_capacity -= estimated_tokens
+                    return
+                request_wait = (1 - self.available_request_capacity) * 60.0 / self.max_requests_per_minute
+                token_wait = (estimated_tokens - self.available_token_capacity) * 60.0 / self.max_tokens_per_minute
+                await asyncio.sleep(max(request_wait, token_wait, 0.01))
+
+
+def estimate_tokens(query):
+    # rough estimate without a tokenizer; Japanese text is about one token per character
+    tokens = EXPECTED_COMPLETION_TOKENS
+    for message in query['messages']:
+        for content in message['content']:
+            if content['type'] == 'text':
+                tokens += len(content['text'])
+            elif content['type'] == 'image_url':
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+def build_query(image_uri, prompt=IMAGE_DESCRIPTION_PROMPT):
+    return {
+        'model': 'gpt-4o-2024-08-06',
+        'messages': [
+            {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': prompt
+                    },
+                    {
+                        'type': 'image_url',
+                        'image_url': {
+                            'url': image_uri
+                        },
+                    },
+                ],
+            }
+        ]}
 
-def transcribe_image_query(filepath):
-    def resize_with_aspect_ratio(image, target_size):
-        original_width, original_height = image.size
-        if original_width > original_height:
-            new_width = target_size
-            new_height = int((target_size / original_width) * original_height)
-        else:
-            new_height = target_size
-            new_width = int((target_size / original_height) * original_width)
-        return image.resize((new_width, new_height))
 
+def transcribe_image_query(filepath, prompt=IMAGE_DESCRIPTION_PROMPT, save_shrunk=False):
     def parse_exif(exif_data):
         def convert_to_degrees(value):
             """Helper function to convert GPS coordinates to degrees."""
@@ -78,7 +159,8 @@ def transcribe_image_query(filepath):
 
         def normalize(value):
             if isinstance(value, IFDRational):
-                float(value)
+                # IFDRational with a zero denominator is NaN
+                return float(value) if value.denominator else None
             elif isinstance(value, (int, str)):
                 return value
             elif isinstance(value, bytes):
@@ -90,15 +172,17 @@ def transcribe_image_query(filepath):
                 print([tag_name, type(value), value], file=sys.stderr)
                 return None
 
+        tags_get = TAGS.get
+        gpstags_get = GPSTAGS.get
         for tag, value in exif_data.items():
-            tag_name = TAGS.get(tag, tag)
+            tag_name = tags_get(tag, tag)
             if tag_name == 'GPSInfo':
                 exif[tag_name] = {}
                 gps_latitude = None
                 gps_longitude = None
                 gps_direction = None
                 for gps_tag in value:
-                    sub_tag_name = GPSTAGS.get(gps_tag, gps_tag)
+                    sub_tag_name = gpstags_get(gps_tag, gps_tag)
                     exif[tag_name][sub_tag_name] = normalize(value[gps_tag])
                     if sub_tag_name == 'GPSLatitude':
                         gps_latitude = convert_to_degrees(value[gps_tag])
@@ -118,18 +202,22 @@ def transcribe_image_query(filepath):
                 if gps_direction is not None:
                     gps_info['Direction'] = gps_direction
             else:
-                if normalize(value):
-                    exif[tag_name] = normalize(value)
+                normalized = normalize(value)
+                if normalized is not None:
+                    exif[tag_name] = normalized
         return gps_info, exif
 
     def get_md5_hash(filepath):
-        # Create an MD5 hash object
-        md5_hash = hashlib.md5()
-
         # Open the file in binary mode
         with open(filepath, 'rb') as file:
-            # Read the file in chunks to avoid memory issues with large files
-            for chunk in iter(lambda: file.read(4096), b''):
+            # hashlib.file_digest runs the read/update loop in C (Python 3.11+)
+            if sys.version_info >= (3, 11):
+                return hashlib.file_digest(file, 'md5').hexdigest()
+
+            # Create an MD5 hash object
+            md5_hash = hashlib.md5()
+            # Read the file in 1 MiB chunks to avoid memory issues with large files
+            while chunk := file.read(1 << 20):
                 md5_hash.update(chunk)
 
         # Return the hexadecimal digest of the MD5 hash
@@ -137,61 +225,51 @@ def transcribe_image_query(filepath):
 
     def linux_time_from_exif(exif):
         # TODO (consider time zone)
-        datestr, timestr = str(exif['DateTime']).split(" ")
-        items = datestr.split(":")
-        items.extend(timestr.split(":"))
-        items = [int(v) for v in items]
-        return datetime.datetime(*items).timestamp()
+        return datetime.datetime.strptime(str(exif['DateTime']), EXIF_DATETIME_FORMAT).timestamp()
 
     image = Image.open(filepath)
     image_hash = get_md5_hash(filepath)
     # Extract EXIF data
     gps_info, exif = parse_exif(image._getexif())
-    image = resize_with_aspect_ratio(image, 512)
+    # let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) before the final resize
+    image.draft('RGB', (512, 512))
+    image.thumbnail((512, 512), Image.LANCZOS)
     with BytesIO() as buffer:
         image.convert('RGB').save(buffer, format='JPEG')
         jpeg_image_bytes = buffer.getvalue()
-    jpeg_filepath = f'{os.path.splitext(filepath)[0]}_shrunk.jpeg'
-    with open(jpeg_filepath, 'wb') as f:
-        f.write(jpeg_image_bytes)
+    if save_shrunk:
+        jpeg_filepath = f'{os.path.splitext(filepath)[0]}_shrunk.jpeg'
+        with open(jpeg_filepath, 'wb') as f:
+            f.write(jpeg_image_bytes)
     base64_image = base64.b64encode(jpeg_image_bytes).decode('utf-8')
     image_uri = f'data:image/jpeg;base64,{base64_image}'
     filename = os.path.basename(filepath)
 
-    return ({
-        'model': 'gpt-4o-2024-08-06',
-        'messages': [
-            {
-                'role': 'user',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': IMAGE_DESCRIPTION_PROMPT
-                    },
-                    {
-                        'type': 'image_url',
-                        'image_url': {
-                            'url': image_uri
-                        },
-                    },
-                ],
-            }
-        ]}, {
-            'filename': filename,
-            'image_hash': image_hash,
-            'location': {
-                'type': 'Point',
-                'coordinates': [gps_info['Longitude'], gps_info['Latitude']]
-            },
-            'direction': float(gps_info['Direction']),
-            'image': image_uri,
-            'linuxtime': linux_time_from_exif(exif),
-            'exif': exif
+    return (build_query(image_uri, prompt), {
+        'filename': filename,
+        'image_hash': image_hash,
+        'location': {
+            'type': 'Point',
+            'coordinates': [gps_info['Longitude'], gps_info['Latitude']]
+        },
+        'direction': float(gps_info['Direction']),
+        'image': image_uri,
+        'linuxtime': linux_time_from_exif(exif),
+        'exif': exif
     })
 
 
-def post_query(query):
-    return openai_client.chat.completions.create(**query)
+@functools.lru_cache(maxsize=None)
+def get_openai_client():
+    # created on first use so that commands without OpenAI calls do not need the key;
+    # the client retries RateLimitError and server errors with exponential backoff
+    return AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=OPENAI_MAX_RETRIES)
+
+
+async def post_query_async(query, limiter=None):
+    if limiter:
+        await limiter.acquire(estimate_tokens(query))
+    return await get_openai_client().chat.completions.create(**query)
 
 
 def get_result(response, metadata):
@@ -235,78 +313,47 @@ def pretty_print(data, depth=1, exclude=None, prefix=''):
         print(F"{'  ' * depth}{prefix}{data}")
 
 
-# Configure MongoDB connection
-mongodb_host = os.getenv('MONGODB_HOST', 'mongodb://mongo:27017/')
-mongodb_name = os.getenv('MONGODB_NAME', 'geo_image_db')
-client = MongoClient(mongodb_host)
-db = client[mongodb_name]
-collection = db['images']
+def diff_entry(existing_entry, data):
+    # large values derived from the file are not compared; image_hash already matched the file
+    get = existing_entry.get
+    return {key: value for key, value in data.items()
+            if (current := get(key, _MISSING)) is _MISSING or (key not in SKIP_DIFF_KEYS and current != value)}
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Process an image file to transcribe its content.')
-    parser.add_argument('-f', '--file', help='Path to the image file')
-    parser.add_argument('-p', '--prompt', help='Prompt to use for the image description')
-    parser.add_argument('-F', '--floor', type=int, help='Floor number of the building')
-    parser.add_argument('-e', '--exif', action='store_true', help='Check the exif data of the image')
-    parser.add_argument('-t', '--tag', action='append', help='Tags to associate with the image (can be used multiple times)')
-    parser.add_argument('-T', '--removetag', action='append', help='Tags to remove from the image')
-    parser.add_argument('-c', '--clear-tags', action='store_true', help='Clear all tags from the image')
-    parser.add_argument('-n', '--dryrun', action='store_true', help='Perform a dry run without modifying the database')
-    parser.add_argument('-r', '--retry', action='store_true', help='Descrtibe image even if the entry has already description')
-    parser.add_argument('-l', '--list', action='store_true', help='List all images in the database')
-    parser.add_argument('-j', '--json', action='store_true', help='Output the json data of the file')
-    parser.add_argument('-J', '--jsonid', type=str, help='Output the json data of the ID')
-    parser.add_argument('-R', '--remove', type=str, help='Remove the entry with the given ID')
-    args = parser.parse_args()
 
-    print(args)
+def list_image_files(directory):
+    filepaths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(('.jpg', '.jpeg')) and not name.endswith('_shrunk.jpeg'):
+                filepaths.append(os.path.join(root, name))
+    return sorted(filepaths)
 
-    if args.list:
-        for entry in collection.find():
-            print(F"ID: {entry['_id']} Filename: {entry['filename']}")
-        sys.exit(0)
 
-    if args.jsonid:
-        entry = collection.find_one({'_id': ObjectId(args.jsonid)})
-        if entry:
-            pretty_json(entry)
-        else:
-            print(f"No entry found with ID: {args.jsonid}")
-        sys.exit(0)
-    if args.remove:
-        result = collection.delete_one({'_id': ObjectId(args.remove)})
-        print(result)
-        sys.exit(0)
-
-    filepath = args.file
-    query, metadata = transcribe_image_query(filepath)
+async def process_image(filepath, args, prompt, limiter):
+    collection = get_collection()
+    # decode/resize/encode in a worker thread (PIL and hashlib release the GIL) to keep requests flowing
+    loop = asyncio.get_running_loop()
+    query, metadata = await loop.run_in_executor(None, transcribe_image_query, filepath, prompt, args.save_shrunk)
     if args.floor is not None:
         metadata['floor'] = args.floor
 
     if args.exif:
+        print(F"{filepath}:")
         pretty_print(metadata['exif'])
-        sys.exit(0)
-
-    if args.prompt:
-        with open(args.prompt, 'r') as f:
-            IMAGE_DESCRIPTION_PROMPT = f.readlines()
-            print("Custom prompt is used:")
-            print(IMAGE_DESCRIPTION_PROMPT)
+        return
 
-    existing_entry = collection.find_one({
+    # pymongo blocks, so the lookup and the writes also run in a worker thread
+    existing_entry = await loop.run_in_executor(None, collection.find_one, {
         'filename': metadata['filename'],
         'image_hash': metadata['image_hash']
     })
 
     if args.json:
         pretty_json(existing_entry)
-        sys.exit(0)
+        return
 
     if existing_entry:
-        update = {}
-        for key in metadata:
-            if key not in existing_entry or existing_entry[key] != metadata[key]:
-                update[key] = metadata[key]
+        update = diff_entry(existing_entry, metadata)
 
         if args.clear_tags:
             update["tags"] = []
@@ -327,20 +374,20 @@ if __name__ == '__main__':
                 pretty_print(query)
         else:
             if args.retry:
-                response = post_query(query)
-                print("Received data:")
+                response = await post_query_async(query, limiter)
+                print(F"Received data for {filepath}:")
                 pretty_print(response)
                 data = get_result(response, metadata)
-                for key in data:
-                    if key not in existing_entry or existing_entry[key] != data[key]:
-                        update[key] = data[key]
+                update.update(diff_entry(existing_entry, data))
 
             print(F"The image is already transcribed ({existing_entry['_id']}):")
             pretty_print(existing_entry['description'])
             if update:
-                collection.update_one(
+                # clearing the import hash makes the next `import_data.py -u` rewrite this entry
+                await loop.run_in_executor(
+                    None, collection.update_one,
                     {'_id': existing_entry['_id']},
-                    {'$set': update}
+                    {'$set': update, '$unset': {'_h': ''}}
                 )
                 print("The entry has been updated with:")
                 pretty_print(update, depth=1)
@@ -349,9 +396,9 @@ if __name__ == '__main__':
             print(f"Dry run: Would post query and insert data for image: {filepath}")
             pretty_print(query)
         else:
-            print("Posting query")
-            response = post_query(query)
-            print("Received data:")
+            print(F"Posting query for {filepath}")
+            response = await post_query_async(query, limiter)
+            print(F"Received data for {filepath}:")
             pretty_print(response)
             data = get_result(response, metadata)
             if args.tag:
@@ -359,6 +406,184 @@ if __name__ == '__main__':
             if 'floor' not in data:
                 data['floor'] = 0
             print("Insert data into the DB")
-            collection.insert_one(data)
+            await loop.run_in_executor(None, collection.insert_one, data)
             print("Description:")
             pretty_print(data, exclude=['image', 'exif'])
+
+
+def write_batch_inputs(collection, entry_filter, prompt):
+    # one JSONL file per batch, each within the Batch API input limits; returns [(path, count)]
+    inputs = []
+    batch_input = None
+    size = 0
+    try:
+        for entry in collection.find(entry_filter, {'image': 1}):
+            line = (json.dumps({
+                'custom_id': str(entry['_id']),
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': build_query(entry['image'], prompt),
+            }) + '\n').encode()
+            if batch_input is None or inputs[-1][1] >= BATCH_MAX_REQUESTS or size + len(line) > BATCH_MAX_BYTES:
+                if batch_input is not None:
+                    batch_input.close()
+                batch_input = tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False)
+                inputs.append([batch_input.name, 0])
+                size = 0
+            batch_input.write(line)
+            inputs[-1][1] += 1
+            size += len(line)
+    except BaseException:
+        for path, _ in inputs:
+            os.remove(path)
+        raise
+    finally:
+        if batch_input is not None:
+            batch_input.close()
+    return inputs
+
+
+async def run_batch(collection, path, count):
+    # returns the number of entries which could not be described
+    try:
+        with open(path, 'rb') as f:
+            input_file = await get_openai_client().files.create(file=f, purpose='batch')
+    finally:
+        os.remove(path)
+
+    batch = await get_openai_client().batches.create(input_file_id=input_file.id, endpoint='/v1/chat/completions', completion_window='24h')
+    print(F"Submitted batch {batch.id} with {count} entries")
+    while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await get_openai_client().batches.retrieve(batch.id)
+        print(F"Batch {batch.id}: {batch.status} {batch.request_counts}")
+    if batch.status != 'completed' or not batch.output_file_id:
+        print(F"Batch {batch.id} did not complete: {batch.status}", file=sys.stderr)
+        return count
+
+    output = await get_openai_client().files.content(batch.output_file_id)
+    ops = []
+    for line in output.text.splitlines():
+        result = json.loads(line)
+        response = result.get('response')
+        if result.get('error') or not response or response['status_code'] != 200:
+            print(F"Failed to describe {result['custom_id']}: {result.get('error') or response}", file=sys.stderr)
+            continue
+        description = response['body']['choices'][0]['message']['content']
+        ops.append(UpdateOne({'_id': ObjectId(result['custom_id'])}, {'$set': {'description': description}, '$unset': {'_h': ''}}))
+    if ops:
+        result = collection.bulk_write(ops, ordered=False)
+        print(F"{result.modified_count} entries have been updated")
+    return count - len(ops)
+
+
+async def describe_in_batch(args, prompt):
+    collection = get_collection()
+    # re-describe the stored images with the OpenAI Batch API (half the cost, no per-request rate limits)
+    entry_filter = {'image': {'$exists': True}}
+    if args.floor is not None:
+        entry_filter['floor'] = args.floor
+
+    inputs = write_batch_inputs(collection, entry_filter, prompt)
+    count = sum(n for _, n in inputs)
+    try:
+        if args.dryrun:
+            print(F"Dry run: Would submit {count} entries in {len(inputs)} batches")
+            return 0
+        if count == 0:
+            print("No entries to describe")
+            return 0
+
+        failed = 0
+        for path, n in inputs:
+            failed += await run_batch(collection, path, n)
+    finally:
+        # run_batch removes its input once uploaded, the rest are left after a dry run or an error
+        for path, _ in inputs:
+            if os.path.exists(path):
+                os.remove(path)
+    return 1 if failed else 0
+
+
+async def main(args):
+    prompt = IMAGE_DESCRIPTION_PROMPT
+    if args.prompt:
+        with open(args.prompt, 'r') as f:
+            prompt = f.read()
+            print("Custom prompt is used:")
+            print(prompt)
+
+    if args.batch:
+        return await describe_in_batch(args, prompt)
+
+    # Ensure the collection is indexed for looking up uploaded images; -e, -n and -j only read
+    if not (args.exif or args.dryrun or args.json):
+        get_collection().create_index([('filename', 1), ('image_hash', 1)])
+
+    filepaths = list(args.file or [])
+    if args.directory:
+        filepaths.extend(list_image_files(args.directory))
+
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=os.cpu_count()))
+    # bound the number of files in the whole pipeline, so only that many encoded images wait for the limiter
+    sem = asyncio.Semaphore(args.concurrency)
+    limiter = RateLimiter(args.max_rpm, args.max_tpm)
+
+    async def bounded_process_image(filepath):
+        async with sem:
+            return await process_image(filepath, args, prompt, limiter)
+
+    results = await asyncio.gather(*[bounded_process_image(filepath) for filepath in filepaths], return_exceptions=True)
+
+    failed = 0
+    for filepath, result in zip(filepaths, results):
+        if isinstance(result, Exception):
+            print(F"Failed to process {filepath}: {result!r}", file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process an image file to transcribe its content.')
+    parser.add_argument('-f', '--file', action='append', help='Path to the image file (can be used multiple times)')
+    parser.add_argument('-d', '--directory', help='Process all images in the directory')
+    parser.add_argument('-B', '--batch', action='store_true', help='Re-describe all images in the database (filtered by --floor) with the OpenAI Batch API')
+    parser.add_argument('-C', '--concurrency', type=int, default=8, help='Maximum number of images processed concurrently')
+    parser.add_argument('--max-rpm', type=float, default=DEFAULT_MAX_REQUESTS_PER_MINUTE, help='Maximum OpenAI requests per minute')
+    parser.add_argument('--max-tpm', type=float, default=DEFAULT_MAX_TOKENS_PER_MINUTE, help='Maximum OpenAI tokens per minute')
+    parser.add_argument('--save-shrunk', action='store_true', help='Save the resized image next to the original as <name>_shrunk.jpeg')
+    parser.add_argument('-p', '--prompt', help='Prompt to use for the image description')
+    parser.add_argument('-F', '--floor', type=int, help='Floor number of the building')
+    parser.add_argument('-e', '--exif', action='store_true', help='Check the exif data of the image')
+    parser.add_argument('-t', '--tag', action='append', help='Tags to associate with the image (can be used multiple times)')
+    parser.add_argument('-T', '--removetag', action='append', help='Tags to remove from the image')
+    parser.add_argument('-c', '--clear-tags', action='store_true', help='Clear all tags from the image')
+    parser.add_argument('-n', '--dryrun', action='store_true', help='Perform a dry run without modifying the database')
+    parser.add_argument('-r', '--retry', action='store_true', help='Descrtibe image even if the entry has already description')
+    parser.add_argument('-l', '--list', action='store_true', help='List all images in the database')
+    parser.add_argument('-j', '--json', action='store_true', help='Output the json data of the file')
+    parser.add_argument('-J', '--jsonid', type=str, help='Output the json data of the ID')
+    parser.add_argument('-R', '--remove', type=str, help='Remove the entry with the given ID')
+    args = parser.parse_args()
+
+    print(args)
+
+    collection = get_collection()
+    if args.list:
+        for entry in collection.find():
+            print(F"ID: {entry['_id']} Filename: {entry['filename']}")
+        sys.exit(0)
+
+    if args.jsonid:
+        entry = collection.find_one({'_id': ObjectId(args.jsonid)})
+        if entry:
+            pretty_json(entry)
+        else:
+            print(f"No entry found with ID: {args.jsonid}")
+        sys.exit(0)
+    if args.remove:
+        result = collection.delete_one({'_id': ObjectId(args.remove)})
+        print(result)
+        sys.exit(0)
+
+    sys.exit(asyncio.run(main(args)))
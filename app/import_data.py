@@ -20,33 +20,116 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import argparse
+import hashlib
+import ijson
+import multiprocessing
+import orjson
 import os
-import sys
-import json
-from pymongo import MongoClient
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from pymongo import ReplaceOne, WriteConcern
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
+from db import get_collection
 
 
-# Configure MongoDB connection
-mongodb_host = os.getenv('MONGODB_HOST', 'mongodb://mongo:27017/')
-mongodb_name = os.getenv('MONGODB_NAME', 'geo_image_db')
-client = MongoClient(mongodb_host)
-db = client[mongodb_name]
-collection = db['images']
+# number of entries sent to MongoDB in a single bulk_write, keeps each request well below the 16 MB message limit
+BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+NDJSON_SUFFIXES = ('.jsonl', '.ndjson')
+DUPLICATE_KEY_ERROR = 11000
 
 
-def import_data(filepath):
-    with open(filepath) as input_stream:
-        for entry in json.load(input_stream):
-            id = entry["_id"]
-            entry["_id"] = ObjectId(id)
-            collection.replace_one({"_id": entry["_id"]}, entry, upsert=True)
-            print(f"{id} upserted")
+def read_entries(input_stream, filepath):
+    if filepath.endswith(NDJSON_SUFFIXES):
+        # one object per line, parsed without ijson's per-event overhead
+        return (orjson.loads(line) for line in input_stream if line.strip())
+    # parse the array incrementally so that only the current batches are held in memory
+    return ijson.items(input_stream, "item", use_float=True)
+
+
+def read_batches(filepath, batch_size):
+    batch = []
+    append = batch.append
+    with open(filepath, "rb") as input_stream:
+        for entry in read_entries(input_stream, filepath):
+            doc_id = entry["_id"]
+            entry["_id"] = ObjectId(doc_id)
+            append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                append = batch.append
+    if batch:
+        yield batch
+
+
+def content_hash(entry):
+    entry.pop("_h", None)
+    return hashlib.md5(orjson.dumps(entry, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+def replace_op(entry, skip_unchanged):
+    if not skip_unchanged:
+        # a hash exported from another database may not match what this import writes
+        entry.pop("_h", None)
+        return ReplaceOne({"_id": entry["_id"]}, entry, upsert=True)
+    # an entry whose stored _h matches does not match the filter, and its upsert fails with a duplicate key
+    entry["_h"] = content_hash(entry)
+    return ReplaceOne({"_id": entry["_id"], "_h": {"$ne": entry["_h"]}}, entry, upsert=True)
+
+
+def write_batch(batch, skip_unchanged=False):
+    # get_collection() creates a MongoClient per process, so this also runs in worker processes
+    # ascending _id keeps the writes on neighbouring index pages
+    batch.sort(key=itemgetter("_id"))
+    ops = [replace_op(entry, skip_unchanged) for entry in batch]
+    # acknowledged by the primary only and not journaled; a re-import is the recovery path for an interrupted ingest
+    collection = get_collection().with_options(write_concern=WriteConcern(w=1, j=False))
+    try:
+        result = collection.bulk_write(ops, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        errors = result["writeErrors"]
+        if not skip_unchanged or any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return result["nUpserted"], result["nModified"], result["nMatched"], len(errors)
+    return result["nUpserted"], result["nModified"], result["nMatched"], 0
+
+
+def import_data(filepath, batch_size=BATCH_SIZE, workers=1, skip_unchanged=False):
+    batches = read_batches(filepath, batch_size)
+    totals = [0, 0, 0, 0]
+
+    def add(counts):
+        for i, count in enumerate(counts):
+            totals[i] += count
+
+    if workers <= 1:
+        for batch in batches:
+            add(write_batch(batch, skip_unchanged))
+    else:
+        # MongoClient is not fork-safe, so the workers are spawned; keep only a few batches in flight
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(write_batch, batch, skip_unchanged))
+                if len(pending) >= workers * 2:
+                    add(pending.popleft().result())
+            while pending:
+                add(pending.popleft().result())
+
+    upserted, modified, matched, unchanged = totals
+    print(f"inserted={upserted} modified={modified} matched={matched} unchanged={unchanged}")
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('Usage: python script.py <image_filepath>')
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Import exported image entries into the database.')
+    parser.add_argument('filepath', help='Path to the exported JSON file, or newline-delimited JSON if it ends with .jsonl or .ndjson')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE, help='Number of entries written per bulk_write')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of processes writing batches in parallel, 1 writes in this process')
+    parser.add_argument('-u', '--skip-unchanged', action='store_true', help='Store a content hash (_h) and skip entries whose stored hash matches; other writers clear _h')
+    args = parser.parse_args()
 
-    import_data(sys.argv[1])
+    import_data(args.filepath, args.batch_size, args.workers, args.skip_unchanged)
@@ -18,15 +18,57 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import asyncio
 import base64
 import cv2
-import json
+import functools
+import hashlib
+import orjson
 import os
+import string
+from collections import OrderedDict
 from openai import AsyncOpenAI
 from pydantic import BaseModel
 
 
 USE_PAST_EXPLANATIONS = os.environ.get("USE_PAST_EXPLANATIONS", "false").lower() == "true"
+# maximum number of OpenAI requests in flight per process, 0 for no limit
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "0"))
+# number of identical queries answered from memory, 0 to always ask OpenAI
+OPENAI_RESPONSE_CACHE_SIZE = int(os.environ.get("OPENAI_RESPONSE_CACHE_SIZE", "0"))
+IMAGE_SIZE = (960, 540)
+JPEG_URI_PREFIX = "data:image/jpeg;base64,"
+
+
+def compile_template(template, **fixed):
+    """
+    split a str.format template into literal chunks and field names once
+
+    input
+    fixed: fields substituted at compile time, they are merged into the literal chunks
+
+    output
+    render: function taking the template fields as keyword arguments, extra keywords are ignored like str.format
+    """
+    parts = []
+    pending = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        if field in fixed:
+            pending += literal + str(fixed[field])
+        else:
+            parts.append((pending + literal, field))
+            pending = ""
+    if pending:
+        parts.append((pending, None))
+
+    def render(**kwargs):
+        pieces = []
+        for literal, field in parts:
+            pieces.append(literal)
+            if field is not None:
+                pieces.append(str(kwargs[field]))
+        return "".join(pieces)
+    return render
 
 
 class TranslatedDescription(BaseModel):
@@ -68,7 +110,6 @@ DESCRIPTION_PROMPT_TEMPLATE = """
 8. 後方に関する説明はしないでください。
 
 """
-
 PAST_EXPLANATIONS_TEMPLATE = """
 ## 過去に説明した内容
 過去にあなたは以下の内容を説明しました。
@@ -77,6 +118,18 @@ PAST_EXPLANATIONS_TEMPLATE = """
 
 {past_explanations}
 """
+render_past_explanations = compile_template(PAST_EXPLANATIONS_TEMPLATE)
+
+
+# USE_PAST_EXPLANATIONS is fixed per deployment, so the check is made once here
+if USE_PAST_EXPLANATIONS:
+    def append_past_explanations(prompt, past_explanations):
+        if past_explanations:
+            return prompt + render_past_explanations(past_explanations=past_explanations)
+        return prompt
+else:
+    def append_past_explanations(prompt, past_explanations):
+        return prompt
 
 
 def determine_sentence_length(request_length, distance_to_travel):
@@ -103,11 +156,15 @@ def determine_sentence_length(request_length, distance_to_travel):
         return 3 + sentence_num_to_add
 
 
+# indexed by whether the description is longer than 2 sentences
+SENTENCE_ATMOSPHERES = (
+    "とても簡潔に、各物体の名前と位置だけ",
+    "各物体の詳細や位置、推測できることや主観的な形容詞を交えつつ詳しく",
+)
+
+
 def sentence_atmosphere_in_Japanese(sentence_length: int) -> str:
-    if sentence_length <= 2:
-        return "とても簡潔に、各物体の名前と位置だけ"
-    else:
-        return "各物体の詳細や位置、推測できることや主観的な形容詞を交えつつ詳しく"
+    return SENTENCE_ATMOSPHERES[sentence_length > 2]
 
 
 def determine_scene_description_style(sentence_length: int, force_use_default_style: bool = True) -> str:
@@ -120,6 +177,20 @@ def determine_scene_description_style(sentence_length: int, force_use_default_st
     return scene_desc_style
 
 
+# only front, right, left and image_tags change between requests with the same length and language
+@functools.lru_cache(maxsize=64)
+def description_prompt_renderer(sentence_length, lang):
+    sentence_atmosphere = sentence_atmosphere_in_Japanese(sentence_length)
+    scene_desc_style = determine_scene_description_style(sentence_length, force_use_default_style=True)
+    return compile_template(DESCRIPTION_PROMPT_TEMPLATE,
+                            min_sentence_length=sentence_length,
+                            max_sentence_length=sentence_length + 1,
+                            sentence_atmosphere=sentence_atmosphere,
+                            scene_description_style=scene_desc_style,
+                            lang=lang,
+                            )
+
+
 def construct_prompt_for_image_description(sentence_length=3,
                                            front="",
                                            right="",
@@ -128,33 +199,21 @@ def construct_prompt_for_image_description(sentence_length=3,
                                            image_tags="",
                                            lang="ja",
                                            ):
-    if front != "":
+    if "\n" in front:
         front = front.replace("\n", " ")
-    if right != "":
+    if "\n" in right:
         right = right.replace("\n", " ")
-    if left != "":
+    if "\n" in left:
         left = left.replace("\n", " ")
 
-    prompt_template = DESCRIPTION_PROMPT_TEMPLATE
-
-    sentence_atmosphere = sentence_atmosphere_in_Japanese(sentence_length)
-    scene_desc_style = determine_scene_description_style(sentence_length, force_use_default_style=True)
-
-    prompt = prompt_template.format(front=front,
-                                    right=right,
-                                    left=left,
-                                    min_sentence_length=sentence_length,
-                                    max_sentence_length=sentence_length + 1,
-                                    image_tags=image_tags,
-                                    sentence_atmosphere=sentence_atmosphere,
-                                    scene_description_style=scene_desc_style,
-                                    lang=lang,
-                                    )
-
-    if USE_PAST_EXPLANATIONS and past_explanations:
-        prompt += PAST_EXPLANATIONS_TEMPLATE.format(past_explanations=past_explanations)
+    render = description_prompt_renderer(sentence_length, lang)
+    prompt = render(front=front,
+                    right=right,
+                    left=left,
+                    image_tags=image_tags,
+                    )
 
-    return prompt
+    return append_past_explanations(prompt, past_explanations)
 
 
 class StopReason(BaseModel):
@@ -201,35 +260,48 @@ thoughtには、pedestrian_infoとobject_infoで、近くに人や障害物が
 15. ユーザは受動的にロボットについて行くため、「少し右側を進むと通れます。」などの具体的な行動を促す表現は使わないでください。
 16. ロボットのカメラの位置は低いので、近い人は足しか見えない可能性があります。近くの人を見逃さないでください。
 """
+render_stop_reason_prompt = compile_template(STOP_REASON_PROMPT_TEMPLATE)
 
 
+# the prompt only depends on lang, and the returned str is immutable
+@functools.lru_cache(maxsize=16)
 def construct_prompt_for_stop_reason(lang="ja"):
-    prompt_template = STOP_REASON_PROMPT_TEMPLATE
-    prompt = prompt_template.format(lang=lang)
+    prompt = render_stop_reason_prompt(lang=lang)
     return prompt
 
 
+# the dummy values only depend on the response_format class, the instance is shared and only read
+@functools.lru_cache(maxsize=32)
+def dummy_parsed(response_format):
+    obj = {}
+    for field in response_format.model_fields.keys():
+        obj[field] = "dummy_value"
+    return response_format.model_validate(obj)
+
+
 class DummyOpenAI:
     class Chat:
         class Completions:
             # 辞書型オブジェクトのキーをプロパティとしてアクセスできるようにし、再帰的に変換するクラス
+            # 変換はアクセスされた時に行い、結果をインスタンスに保存する
             class DictToObject:
                 def __init__(self, obj):
                     self.obj = obj
-                    for key, value in obj.items():
-                        if isinstance(value, dict):
-                            setattr(self, key, DummyOpenAI.Chat.Completions.DictToObject(value))
-                        elif isinstance(value, list):
-                            setattr(
-                                self,
-                                key,
-                                [DummyOpenAI.Chat.Completions.DictToObject(item) if isinstance(item, dict) else item for item in value],
-                            )
-                        else:
-                            setattr(self, key, value)
+
+                def __getattr__(self, key):
+                    try:
+                        value = self.__dict__["obj"][key]
+                    except KeyError:
+                        raise AttributeError(key) from None
+                    if isinstance(value, dict):
+                        value = DummyOpenAI.Chat.Completions.DictToObject(value)
+                    elif isinstance(value, list):
+                        value = [DummyOpenAI.Chat.Completions.DictToObject(item) if isinstance(item, dict) else item for item in value]
+                    setattr(self, key, value)
+                    return value
 
                 def model_dump_json(self):
-                    return json.dumps(self.obj, ensure_ascii=False)
+                    return orjson.dumps(self.obj).decode()
 
             async def parse(self, model, messages, max_tokens, response_format):
                 result = DummyOpenAI.Chat.Completions.DictToObject({
@@ -241,11 +313,7 @@ class DummyOpenAI:
                         }
                     ]
                 })
-                obj = {}
-                for field in response_format.model_fields.keys():
-                    obj[field] = "dummy_value"
-                parsed_obj = response_format.model_validate(obj)
-                result.choices[0].message.parsed = parsed_obj
+                result.choices[0].message.parsed = dummy_parsed(response_format)
                 return result
 
             async def create(self, model, messages, max_tokens):
@@ -271,6 +339,28 @@ class DummyOpenAI:
         self.beta = DummyOpenAI.Beta()
 
 
+# placeholder choices of a failed query, shared by every error response and only read
+ERROR_CHOICES = [
+    {
+        "message": {
+            "parsed": {
+                "description": "dummy",
+                "message": "dummy",
+                "translated": "dummy",
+                "lang": "dummy",
+            }
+        }
+    }
+]
+
+SYSTEM_PROMPT = "あなたは視覚障害者が周囲の状況を理解するための説明アシスタントです。"
+# shared by every request, the SDK only reads it
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": SYSTEM_PROMPT
+}
+
+
 class GPTAgent:
     def __init__(self, model="gpt-4o"):
         self.api_key = os.environ.get('OPENAI_API_KEY')
@@ -282,21 +372,23 @@ class GPTAgent:
             self.client = AsyncOpenAI()
         self.model = model
         self.past_descriptions = []
+        # created on first use so that it belongs to the running event loop
+        self.semaphore = None
+        self.response_cache = OrderedDict()
 
     # Function to encode the image
     def encode_image(self, image):
         if os.path.exists(image):
             image = cv2.imread(image)
-            image = cv2.resize(image, (960, 540))
+            image = cv2.resize(image, IMAGE_SIZE, interpolation=cv2.INTER_AREA)
+        # the encoded numpy buffer is passed to b64encode as is, without a bytes copy
         _, buffer = cv2.imencode('.jpg', image)
-        image_bytes = buffer.tobytes()
-        return base64.b64encode(image_bytes).decode('utf-8')
+        return base64.b64encode(buffer).decode('utf-8')
 
     def get_encoding(self, encoded_image):
-        prefix = "data:image/jpeg;base64,"
-        if encoded_image.startswith(prefix):
-            encoded_image = encoded_image[len(prefix):]
-        return f"{prefix}{encoded_image}"
+        if encoded_image.startswith(JPEG_URI_PREFIX):
+            return encoded_image
+        return f"{JPEG_URI_PREFIX}{encoded_image}"
 
     # Prepare image message content
     def get_encoded_image_message(self, encoded_image):
@@ -316,15 +408,23 @@ class GPTAgent:
     def update_past_descriptions(self, description, lat, lng):
         self.past_descriptions.append({"description": description, "location": {"lat": lat, "lng": lng}})
 
+    def cache_key(self, query, response_format):
+        # the query holds the model, the prompt and the image data uris
+        key = hashlib.blake2b(orjson.dumps(query), digest_size=16)
+        if response_format:
+            key.update(response_format.__name__.encode())
+        return key.hexdigest()
+
+    async def request(self, query, response_format):
+        if response_format:
+            query2 = {**query, **{"response_format": response_format}}
+            return await self.client.beta.chat.completions.parse(**query2)
+        return await self.client.chat.completions.create(**query)
+
     # Function to query with images
     async def query_with_images(self, prompt, images=[], max_tokens=3000, response_format=None):
         # Preparing the content with the prompt and images
-        messages = [
-            {
-                "role": "system",
-                "content": "あなたは視覚障害者が周囲の状況を理解するための説明アシスタントです。"
-            }
-        ]
+        messages = [SYSTEM_MESSAGE]
         for image in images:
             if 'image_uri' in image:
                 image_uri = image['image_uri']
@@ -351,29 +451,27 @@ class GPTAgent:
             "messages": messages,
             "max_tokens": max_tokens
         }
+        key = None
+        if OPENAI_RESPONSE_CACHE_SIZE > 0:
+            key = self.cache_key(query, response_format)
+            if key in self.response_cache:
+                self.response_cache.move_to_end(key)
+                return (self.response_cache[key], query)
         # Making the API call
         try:
-            if response_format:
-                query2 = {**query, **{"response_format": response_format}}
-                response = await self.client.beta.chat.completions.parse(**query2)
+            if OPENAI_MAX_CONCURRENCY > 0:
+                if self.semaphore is None:
+                    self.semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+                async with self.semaphore:
+                    response = await self.request(query, response_format)
             else:
-                response = await self.client.chat.completions.create(**query)
+                response = await self.request(query, response_format)
         except Exception as e:
-            response = DummyOpenAI.Chat.Completions.DictToObject(
-                {
-                    "error": str(e),
-                    "choices": [
-                        {
-                            "message": {
-                                "parsed": {
-                                    "description": "dummy",
-                                    "message": "dummy",
-                                    "translated": "dummy",
-                                    "lang": "dummy",
-                                }
-                            }
-                        }
-                    ],
-                }
-            )
+            response = DummyOpenAI.Chat.Completions.DictToObject({"error": str(e), "choices": ERROR_CHOICES})
+        else:
+            # refusals have no parsed value and are not kept
+            if key is not None and (not response_format or response.choices[0].message.parsed is not None):
+                self.response_cache[key] = response
+                if len(self.response_cache) > OPENAI_RESPONSE_CACHE_SIZE:
+                    self.response_cache.popitem(last=False)
         return (response, query)
@@ -21,6 +21,7 @@
 import logging
 import os
 import secrets
+import time
 from fastapi import APIRouter, Form, Header, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pathlib import Path
@@ -30,21 +31,43 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# In-memory token storage for simplicity
-tokens = set()
+# In-memory token storage for simplicity, token -> expiry in time.monotonic() seconds
+tokens = {}
+TOKEN_TTL = float(os.getenv("TOKEN_TTL", "86400"))
+# read once at import; an unset or empty API_KEY disables key authentication
+API_KEY_BYTES = os.getenv("API_KEY", "").encode()
 
 
 def generate_token():
     return secrets.token_hex(128)
 
 
+def add_token(token):
+    now = time.monotonic()
+    # drop expired tokens here so that logins without a logout do not accumulate
+    # verify_api_key_or_cookie runs in the threadpool, so iterate over a snapshot and pop without raising
+    for t, expiry in list(tokens.items()):
+        if expiry <= now:
+            tokens.pop(t, None)
+    tokens[token] = now + TOKEN_TTL
+
+
+def is_valid_token(token):
+    expiry = tokens.get(token)
+    if expiry is None:
+        return False
+    if expiry <= time.monotonic():
+        tokens.pop(token, None)
+        return False
+    return True
+
+
 def verify_api_key_or_cookie(request: Request, x_api_key: Optional[str] = Header(None)):
     logger.info(f"verify_api_key_or_cookie {x_api_key=}")
-    API_KEY = os.getenv("API_KEY")
-    if x_api_key and x_api_key == API_KEY:
+    if API_KEY_BYTES and x_api_key and secrets.compare_digest(x_api_key.encode(), API_KEY_BYTES):
         return
     token = request.cookies.get("token")
-    if not token or token not in tokens:
+    if not token or not is_valid_token(token):
         raise HTTPException(
             status_code=status.HTTP_303_SEE_OTHER,
             detail="Redirecting to login",
@@ -70,7 +93,7 @@ async def login(request: Request, response: Response, username: str = Form(...),
     if not correct_password or not secrets.compare_digest(correct_password, password):
         return HTMLResponse(content="Invalid username or password", status_code=status.HTTP_401_UNAUTHORIZED)
     token = generate_token()
-    tokens.add(token)
+    add_token(token)
     redirect_url = next if next else "/"
     response = RedirectResponse(url=redirect_url, status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(key="token", value=token, httponly=True, secure=True, path="/")
@@ -81,8 +104,7 @@ async def login(request: Request, response: Response, username: str = Form(...),
 @router.get("/logout")
 async def logout(request: Request, response: Response):
     token = request.cookies.get("token")
-    if token in tokens:
-        tokens.remove(token)
+    tokens.pop(token, None)
     response.delete_cookie("token", path="/")
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
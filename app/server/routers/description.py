@@ -20,12 +20,13 @@
 
 import base64
 import datetime
-import json
 import logging
 import math
+import orjson
 import os
 import time
 from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 
 # Import required functions/classes from openai_agent and auth
@@ -143,7 +144,8 @@ async def read_description_by_lat_lng(lat: float = Query(...),
                                       sentence_length: Optional[int] = Query(3),
                                       ):
     logger.info("description get")
-    locations = get_description_by_lat_lng(lat, lng, floor, max_distance, max_count)
+    # pymongo blocks, keep the $near query off the event loop
+    locations = await run_in_threadpool(get_description_by_lat_lng, lat, lng, floor, max_distance, max_count)
 
     location_per_directions, past_explanations = preprocess_descriptions(locations, rotation, lat, lng, max_distance)
 
@@ -182,7 +184,7 @@ async def read_description_by_lat_lng(lat: float = Query(...),
     log_json(directory=date, name="openai-query", data=query)
     log_json(directory=date, name="openai-prompt", data=prompt)
     log_json(directory=date, name="locations", data=locations)
-    log_json(directory=date, name="openai-response", data=json.loads(original_result.model_dump_json()))
+    log_json(directory=date, name="openai-response", data=orjson.loads(original_result.model_dump_json()))
 
     if hasattr(original_result, "error"):
         raise HTTPException(status_code=400, detail=original_result.error)
@@ -212,18 +214,13 @@ async def read_description_by_lat_lng_with_image(request: Request,
     logger.info("description_with_live_image post")
     locations = []
     if not use_live_image_only:
-        locations = get_description_by_lat_lng(lat, lng, floor, max_distance, max_count)
+        locations = await run_in_threadpool(get_description_by_lat_lng, lat, lng, floor, max_distance, max_count)
 
     images = await request.json()
 
     location_per_directions, past_explanations = preprocess_descriptions(locations, rotation, lat, lng, max_distance)
 
-    count = 1
-    tags = ""
-    for image in images:
-        position = image['position']
-        tags += f"{count}枚目: {position}\n"
-        count += 1
+    tags = "".join(f"{count}枚目: {image['position']}\n" for count, image in enumerate(images, 1))
 
     prompt = construct_prompt_for_image_description(sentence_length=sentence_length,
                                                     front=location_per_directions["front"]["description"],
@@ -263,7 +260,7 @@ async def read_description_by_lat_lng_with_image(request: Request,
     log_json(directory=date, name="openai-query", data=query)
     log_json(directory=date, name="openai-prompt", data=prompt)
     log_json(directory=date, name="locations", data=locations)
-    log_json(directory=date, name="openai-response", data=json.loads(original_result.model_dump_json()))
+    log_json(directory=date, name="openai-response", data=orjson.loads(original_result.model_dump_json()))
 
     if hasattr(original_result, "error"):
         raise HTTPException(status_code=400, detail=original_result.error)
@@ -292,6 +289,10 @@ async def stop_reason(request: Request,
             continue
         temp.append(image)
 
+    # the stop reason is read from the front image, do not send a query without one
+    if not any("image_uri" in image for image in temp):
+        raise HTTPException(status_code=400, detail="front image is required")
+
     prompt = construct_prompt_for_stop_reason(lang=lang)
 
     st = time.time()
@@ -320,7 +321,7 @@ async def stop_reason(request: Request,
     log_json(directory=date, name="openai-query", data=query)
     log_text(directory=date, name="openai-prompt", data=prompt)
     log_json(
-        directory=date, name="openai-response", data=json.loads(original_result.model_dump_json())
+        directory=date, name="openai-response", data=orjson.loads(original_result.model_dump_json())
     )
     log_image(directory=date, position="front", images=temp)
 
@@ -338,8 +339,8 @@ async def stop_reason(request: Request,
 def log_json(directory, name, data):
     basepath = f"/logs/{directory}"
     os.makedirs(basepath, exist_ok=True)
-    with open(f"{basepath}/{name}.json", "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(f"{basepath}/{name}.json", "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 
 def log_text(directory, name, data):
@@ -357,4 +358,4 @@ def log_image(directory, position, images):
     basepath = f"/logs/{directory}"
     os.makedirs(basepath, exist_ok=True)
     with open(f"{basepath}/{position}.jpg", "wb") as f:
-        f.write(base64.b64decode(image_uri.split(",")[1]))
+        f.write(base64.b64decode(image_uri[image_uri.index(",") + 1:]))
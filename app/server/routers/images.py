@@ -27,7 +27,8 @@ from starlette.background import BackgroundTask
 from .auth import verify_api_key_or_cookie
 from bson import ObjectId
 from export_data import export_data
-from import_data import import_data, collection
+from db import get_collection
+from import_data import import_data
 
 
 logger = logging.getLogger(__name__)
@@ -61,11 +62,11 @@ async def import_images(request: Request, background_tasks: BackgroundTasks):
 
 @router.delete('/image', dependencies=[Depends(verify_api_key_or_cookie)])
 async def delete_images(background_tasks: BackgroundTasks):
-    background_tasks.add_task(collection.delete_many, {})
+    background_tasks.add_task(get_collection().delete_many, {})
     return JSONResponse(content={'message': 'success'}, status_code=202)
 
 
 @router.delete('/image/{id}', dependencies=[Depends(verify_api_key_or_cookie)])
 async def delete_image(id: str, background_tasks: BackgroundTasks):
-    background_tasks.add_task(collection.delete_one, {'_id': ObjectId(id)})
+    background_tasks.add_task(get_collection().delete_one, {'_id': ObjectId(id)})
     return JSONResponse(content={'message': 'success'}, status_code=202)
@@ -48,7 +48,7 @@ def read_location(location_id: str, request: Request):
 
 
 @router.post("/update_description", dependencies=[Depends(verify_api_key_or_cookie)])
-async def update(id: str = Query(...), description: str = Form(...)):
+def update(id: str = Query(...), description: str = Form(...)):
     logger.info(["updateDescription", id, description])
     # Find the document by ID
     location = image_collection.find_one({"_id": ObjectId(id)})
@@ -56,14 +56,14 @@ async def update(id: str = Query(...), description: str = Form(...)):
         raise HTTPException(status_code=404, detail="Document not found")
     image_collection.update_one(
         {"_id": ObjectId(id)},
-        {"$set": {"description": description}}
+        {"$set": {"description": description}, "$unset": {"_h": ""}}
     )
     logger.info(F"updated description {description}")
     return {"message": "Description updated successfully", "description": description}
 
 
 @router.post("/update_floor", dependencies=[Depends(verify_api_key_or_cookie)])
-async def update_floor(id: str = Query(...), floor: int = Form(...)):
+def update_floor(id: str = Query(...), floor: int = Form(...)):
     logger.info(["updateFloor", id, floor])
     # Find the document by ID
     location = image_collection.find_one({"_id": ObjectId(id)})
@@ -71,14 +71,14 @@ async def update_floor(id: str = Query(...), floor: int = Form(...)):
         raise HTTPException(status_code=404, detail="Document not found")
     image_collection.update_one(
         {"_id": ObjectId(id)},
-        {"$set": {"floor": floor}}
+        {"$set": {"floor": floor}, "$unset": {"_h": ""}}
     )
     logger.info(F"updated floor {floor}")
     return {"message": "Floor updated successfully", "floor": floor}
 
 
 @router.post("/add_tag", dependencies=[Depends(verify_api_key_or_cookie)])
-async def add_tag(id: str = Query(...), tag: str = Form(...)):
+def add_tag(id: str = Query(...), tag: str = Form(...)):
     logger.info(["addTag", id, tag])
     # Find the document by ID
     location = image_collection.find_one({"_id": ObjectId(id)})
@@ -94,14 +94,14 @@ async def add_tag(id: str = Query(...), tag: str = Form(...)):
     updated_tags = existing_tags + [tag]
     image_collection.update_one(
         {"_id": ObjectId(id)},
-        {"$set": {"tags": updated_tags}}
+        {"$set": {"tags": updated_tags}, "$unset": {"_h": ""}}
     )
     logger.info(F"updated tags {updated_tags}")
     return {"message": "Tag added successfully", "tag": tag, "all_tags": updated_tags}
 
 
 @router.post("/clear_tag", dependencies=[Depends(verify_api_key_or_cookie)])
-async def clear_tag(id: str = Query(...)):
+def clear_tag(id: str = Query(...)):
     logger.info(["clearTag", id])
     # Find the document by ID
     location = image_collection.find_one({"_id": ObjectId(id)})
@@ -113,7 +113,7 @@ async def clear_tag(id: str = Query(...)):
     updated_tags = []
     image_collection.update_one(
         {"_id": ObjectId(id)},
-        {"$set": {"tags": updated_tags}}
+        {"$set": {"tags": updated_tags}, "$unset": {"_h": ""}}
     )
     logger.info(F"updated tags {updated_tags}")
     return {"message": "Tag cleared successfully"}
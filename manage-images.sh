@@ -56,7 +56,7 @@ function help() {
     echo "   $0 -i <image> -n                    # check actions without execution"
     echo ""
     echo "  Examples (process images in the dir):"
-    echo "   $0 -I /path/to/images               # process all images in the dir one by one, you can use all the options above"
+    echo "   $0 -I /path/to/images               # process all images in the dir concurrently, you can use all the options above"
     echo ""
     echo "  Examples (others):"
     echo "   $0 -X <output_file>                 # export all data into a JSON file"
@@ -64,8 +64,10 @@ function help() {
     echo "   $0 -l                               # list all JSON IDs in the DB"
     echo "   $0 -J <id>                          # check the JSON data which is identified by the specified ID"
     echo "   $0 -R <id>                          # remove the specified JSON from the DB"
+    echo "   $0 -B (-F <floor>) (-p <prompt>)    # re-describe all images in the DB with the OpenAI Batch API"
     echo ""
     echo "  -d              : Development mode"
+    echo "  -B              : Re-describe all images in the DB with the OpenAI Batch API"
     echo "  -c              : Clear all tags"
     echo "  -e              : Check EXIF"
     echo "  -F <floor>      : Specify the floor of the image"
@@ -101,9 +103,13 @@ JSON=
 TAGS=
 IMPORT=
 EXPORT=
+BATCH=
 
-while getopts "cdeF:hI:i:J:jlnp:R:rt:T:P:X:" OPT; do
+while getopts "BcdeF:hI:i:J:jlnp:R:rt:T:P:X:" OPT; do
     case $OPT in
+        B)
+            BATCH="-B"
+            ;;
         c)
             TAGS="-c"
             ;;
@@ -181,6 +187,7 @@ if $DEBUG; then
     echo "TAGS: $TAGS"
     echo "IMPORT: $IMPORT"
     echo "EXPORT: $EXPORT"
+    echo "BATCH: $BATCH"
 fi
 
 function upload_image() {
@@ -204,6 +211,20 @@ function upload_image() {
       "./image_uploader.py -f /tmp/$image_name $RETRY $DRY_RUN $EXIF $PROMPT_OPTION $FLOOR $LIST $JSON $TAGS"
 }
 
+function upload_directory() {
+    local directory=$(realpath $1)
+
+    prompt=$(realpath $PROMPT)
+
+    blue "Uploading images in $directory"
+
+    docker compose --profile $PROFILE run --rm \
+      -v $directory:/tmp/images \
+      -v $prompt:/tmp/prompt.txt \
+      image_desc-upload-$PROFILE bash -c \
+      "./image_uploader.py -d /tmp/images $RETRY $DRY_RUN $EXIF $PROMPT_OPTION $FLOOR $TAGS"
+}
+
 if [[ -n $EXPORT ]]; then
     if [[ -e $EXPORT ]]; then
         err "File already exists: $EXPORT"
@@ -224,13 +245,15 @@ elif [[ -n $IMPORT ]]; then
       -v $(realpath $IMPORT):/tmp/import.json \
       image_desc-upload-$PROFILE bash -c \
         "./import_data.py /tmp/import.json"
+elif [[ -n $BATCH ]]; then
+    docker compose --profile $PROFILE run --rm \
+      -v $(realpath $PROMPT):/tmp/prompt.txt \
+      image_desc-upload-$PROFILE bash -c \
+        "./image_uploader.py $BATCH $DRY_RUN $PROMPT_OPTION $FLOOR"
 elif [[ -n $IMAGE ]] || [[ -n $JSON ]] || [[ -n $LIST ]]; then
     upload_image $IMAGE
 elif [[ -n $DIRECTORY ]]; then
-    files=$(find $DIRECTORY -type f \( -iname "*.jpg" -o -iname "*.jpeg" \) -not -name "*_shrunk.jpeg")
-    for file in $files; do
-        upload_image $file
-    done
+    upload_directory $DIRECTORY
 else
     help
 fi
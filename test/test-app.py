@@ -23,6 +23,7 @@ import logging
 import pytest
 import os
 import json
+import time
 from pymongo import MongoClient
 from bson import ObjectId
 from fastapi.testclient import TestClient
@@ -35,6 +36,7 @@ os.environ["MONGODB_HOST"] = "mongodb://mongo-test:27017/"
 os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "__DUMMY_OPENAI_API_KEY__")
 
 from server.app import app   # noqa: E402, needs to be loaded after the environment variables are set
+from server.routers import auth   # noqa: E402
 
 client = TestClient(app, follow_redirects=False)
 
@@ -109,10 +111,25 @@ def test_login():
 
 # Test the logout endpoint
 def test_logout(login):
+    token = client.cookies.get("token")
+    assert token in auth.tokens
+
     # Logout
     response = client.get("/logout")
     assert response.status_code == 303
     assert "token" not in response.cookies
+    assert token not in auth.tokens
+
+
+# Test that an expired login cookie is redirected to the login page
+def test_expired_token(login):
+    token = client.cookies.get("token")
+    auth.tokens[token] = time.monotonic() - 1
+
+    response = client.get("/locations?lat=35.62414&lng=139.7754&distance=1000")
+    assert response.status_code == 303
+    assert response.headers["Location"].startswith("/login")
+    assert token not in auth.tokens
 
 
 # Test the read_location endpoint
@@ -138,6 +155,14 @@ def test_update_description(login, insert_dummy_data):
     assert response.status_code == 200
 
 
+# Test that an edit clears the content hash written by import_data.py -u
+def test_update_description_clears_import_hash(login, insert_dummy_data):
+    image_collection.update_one({"_id": insert_dummy_data}, {"$set": {"_h": "imported"}})
+    response = client.post(f"/update_description?id={insert_dummy_data}", data={"description": "New description"})
+    assert response.status_code == 200
+    assert "_h" not in image_collection.find_one({"_id": insert_dummy_data})
+
+
 # Test the update_floor endpoint
 def test_update_floor(login, insert_dummy_data):
     # Update floor
@@ -219,6 +244,12 @@ def test_stop_reason_with_image_ja(api_key_headers, insert_dummy_data):
     assert "description" in json_response
 
 
+def test_stop_reason_without_front_image(api_key_headers):
+    image_payload = [{"position": "left", "image_uri": "data:image/jpeg;base64,"}]
+    response = client.post("/stop_reason", headers=api_key_headers, json=image_payload)
+    assert response.status_code == 400
+
+
 @pytest.mark.parametrize("lang", ["en", "zh"])
 def test_read_description_by_lat_lng_with_api_key_lang(api_key_headers, lang):
     response = client.get(